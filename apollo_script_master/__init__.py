@@ -16,6 +16,7 @@ import logging
 import sys
 
 from apollo_script_master.config import validate_config_file
+from ._asm.engine import dispose_engines
 from ._asm.orm import ASMImpl
 
 __version__ = "0.0.1"
@@ -60,6 +61,11 @@ def main():
     The conn_params argument is a JSON string containing the connection parameters to use for the connection.
     For example:
     >>> {"engine": "mssql", "host": "localhost", "port": 1433, "database": "master", "username": "sa", "password": "password"}
+
+    The command argument selects what to do:
+    >>> run    # Scan the directory and apply the changes in one step (default).
+    >>> plan   # Scan the directory and write the changes to --plan_file for review.
+    >>> apply  # Apply the changes in --plan_file without scanning the directory.
     """
     logging.info(__author__)
     parser = argparse.ArgumentParser()
@@ -67,6 +73,10 @@ def main():
         parser.add_argument("--conn_params", type=str, help="The connection parameters to use for the connection.", )
         parser.add_argument("--directory", type=str, help="The directory of SQL files to be managed.")
         parser.add_argument("--author", type=str, help="The author to use for the connection.")
+        parser.add_argument("--command", type=str, choices=["run", "plan", "apply"], default="run",
+                            help="Run directly, write a plan file, or apply a plan file.")
+        parser.add_argument("--plan_file", type=str, default="asm.plan.json",
+                            help="The plan file to write or apply.")
         args = parser.parse_args()
 
         asm = ASM(
@@ -74,7 +84,12 @@ def main():
             directory=args.directory,
             author=args.author
         )
-        asm.run()
+        if args.command == "plan":
+            asm.plan(plan_file=args.plan_file)
+        elif args.command == "apply":
+            asm.apply(plan_file=args.plan_file)
+        else:
+            asm.run()
     except Exception as error:
         logging.error(f"An error occurred when trying to start the process: {error}.")
         sys.exit(1)
@@ -0,0 +1,93 @@
+"""
+Engine management module.
+
+Engines are registered process-wide, keyed by their URL and options, so that repeated
+ASM runs in the same process reuse warm connection pools and bootstrap the tracking
+tables only once per engine.
+"""
+import logging
+import threading
+
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+_REGISTRY = {}
+_REGISTRY_LOCKS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _registry_key(url: str, options: dict) -> tuple:
+    """
+    Generates the registry key for an engine.
+
+    Args:
+        url: The URL of the engine.
+        options: The options passed to create_engine.
+
+    Returns:
+        A hashable key for the engine.
+    """
+    return url, tuple(sorted((key, repr(value)) for key, value in options.items()))
+
+
+def get_session_factory(url: str, metadata: MetaData, **options) -> sessionmaker:
+    """
+    Gets the session factory for the given URL and options, creating the engine and
+    the tracking tables in the metadata on first use.
+    Engines are created under a lock per key, so a slow or unreachable database only
+    blocks callers waiting on that same engine.
+
+    Args:
+        url: The URL of the engine.
+        metadata: The metadata to create on the engine.
+        **options: The options to pass to create_engine.
+
+    Returns:
+        The session factory bound to the engine.
+    """
+    key = _registry_key(url, options)
+    with _REGISTRY_LOCK:
+        factory = _REGISTRY.get(key)
+        key_lock = _REGISTRY_LOCKS.setdefault(key, threading.Lock())
+    if factory is not None:
+        logging.info("Reusing ASM engine.")
+        return factory
+
+    with key_lock:
+        with _REGISTRY_LOCK:
+            factory = _REGISTRY.get(key)
+        if factory is not None:
+            logging.info("Reusing ASM engine.")
+            return factory
+
+        logging.info("Creating ASM engine.")
+        engine = create_engine(url, **options)
+        try:
+            metadata.create_all(engine)
+        except Exception as error:
+            logging.error(f"An error occurred when trying to bootstrap the engine: {error}.")
+            engine.dispose()
+            raise error
+        factory = sessionmaker(bind=engine)
+        with _REGISTRY_LOCK:
+            _REGISTRY[key] = factory
+    return factory
+
+
+def dispose_engines() -> None:
+    """
+    Disposes all registered engines and clears the registry.
+    Each engine is disposed under its key lock, so a concurrent caller creating an engine
+    finishes registering it first and no key ends up with two engines.
+    """
+    with _REGISTRY_LOCK:
+        key_locks = list(_REGISTRY_LOCKS.items())
+    for key, key_lock in key_locks:
+        with key_lock:
+            with _REGISTRY_LOCK:
+                factory = _REGISTRY.pop(key, None)
+            if factory is not None:
+                engine: Engine = factory.kw["bind"]
+                engine.dispose()
+    logging.info("Disposed ASM engines.")
@@ -6,14 +6,16 @@ import os
 import re
 import time
 from datetime import datetime
+from typing import Callable
 
 from sqlalchemy import Integer, Column, String, DateTime, Boolean, text
-from sqlalchemy import create_engine
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from apollo_script_master.config import validate_config_file
+from .engine import get_session_factory
 from .files import collect_files, hash_file_collection, minify_sql
+from .plan import build_plan, read_plan, write_plan
 
 BASE = declarative_base()
 ASP_CONFIG = os.getenv("ASP_CONFIG", {})
@@ -48,6 +50,8 @@ def url_manager(**kwargs) -> str:
 class ASMImpl:
     """
     ASMImpl is a class to manage the ORM session.
+    Engines are shared across ASMImpl objects in the process, while each run opens and closes its own session,
+    so runs can be made from multiple threads.
     """
 
     def __init__(
@@ -68,40 +72,48 @@ class ASMImpl:
         self.directory = directory
         self.author = author
         self.config_file = validate_config_file(config_file)
-        self.session = self._set_session()
 
-    def _set_session(self) -> sessionmaker.__call__:
+    def _session_factory(self) -> sessionmaker:
         """
-        Sets the ORM session for the ASM object.
-        A connection string is generated from the conn_params and passed to the sessionmaker.
+        Gets the ORM session factory for the ASM object.
+        A connection string is generated from the conn_params and the factory is taken from the engine registry,
+        which reuses the engine and its connection pool across ASM objects with the same connection parameters.
         """
         logging.info("Setting up ASM session.")
         url = url_manager(**self.__conn_params)
-        engine = create_engine(
-            url,
-            echo=self.config_file.get("global", {}).get("echo", False),
-            isolation_level=self.config_file.get("global", {}).get("isolation_level", "READ UNCOMMITTED"),
-        )
-        BASE.metadata.create_all(engine)
-        session = sessionmaker(bind=engine)
-        return session()
-
-    def get_session(self):
+        global_config = self.config_file.get("global", {})
+        options = {
+            "echo": global_config.get("echo", False),
+            "isolation_level": global_config.get("isolation_level", "READ UNCOMMITTED"),
+            "pool_pre_ping": global_config.get("pool_pre_ping", True),
+        }
+        for option in ("pool_size", "max_overflow", "pool_recycle"):
+            if option in global_config:
+                options[option] = global_config[option]
+        return get_session_factory(url, BASE.metadata, **options)
+
+    def get_session(self) -> Session:
         """
-        Get the session for the ASM object.
+        Get a new session for the ASM object. Runs open their own sessions, so the caller owns and must close it.
         """
-        return self.session
+        return self._session_factory()()
 
-    def _populate_lock_table(self) -> None:
+    def _populate_lock_table(self, session: Session) -> None:
         logging.info("Populating lock table.")
         try:
-            if not self.session.query(ASMDeployLock).count() > 0:
+            if not session.query(ASMDeployLock).count() > 0:
                 logging.info("Lock table is empty, populating.")
                 record = ASMDeployLock(
+                    id=1,
                     locked=False,
                     lockedby="root"
                 )
-                self.session.add(record)
+                session.add(record)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    logging.info("Lock table was populated by another run.")
+                    session.rollback()
         except SQLAlchemyError as error:
             logging.error(f"An error occurred when trying to populate the lock table: {error}.")
             raise error
@@ -125,10 +137,18 @@ class ASMImpl:
                 }
         return filesets
 
-    def close_lock(self) -> None:
+    @staticmethod
+    def _lock_id(session: Session) -> int:
+        """
+        Get the id of the lock record, the first record in ASMDeployLock.
+        """
+        return session.query(ASMDeployLock.id).order_by(ASMDeployLock.id).limit(1).scalar()
+
+    def close_lock(self, session: Session) -> None:
         """
         First check if the lock is open in ASMDeployLock, if not wait until it is.
         Then set the lock to True so that no other process can run.
+        The check and set is a single conditional UPDATE, so only one run can close an open lock.
         Checks:
             deploy_lock_table:
               lock_check_retries
@@ -138,14 +158,14 @@ class ASMImpl:
         logging.info("Closing lock.")
         lock_check_retries = self.config_file.get("deploy_lock_table", {}).get("lock_check_retries", 10)
         lock_check_wait = self.config_file.get("deploy_lock_table", {}).get("lock_check_wait", 30)
-        record = self.session.query(ASMDeployLock).first()
+        lock_id = self._lock_id(session)
         for _ in range(lock_check_retries):
-            self.session.refresh(record)
-            if record.locked is False:
-                record.locked = True
-                record.lockedby = self.author
-                self.session.add(record)
-                self.session.commit()
+            closed = session.query(ASMDeployLock).filter(
+                ASMDeployLock.id == lock_id,
+                ASMDeployLock.locked.is_(False),
+            ).update({"locked": True, "lockedby": self.author}, synchronize_session=False)
+            session.commit()
+            if closed == 1:
                 break
             else:
                 logging.info(
@@ -155,121 +175,246 @@ class ASMImpl:
             logging.error("Lock is still closed, cannot continue.")
             raise Exception("Lock is still closed, cannot continue.")
 
-    def open_lock(self) -> None:
+    def open_lock(self, session: Session) -> None:
         """
         Open the lock in ASMDeployLock.
         """
         logging.info("Opening lock.")
-        record = self.session.query(ASMDeployLock).first()
-        record.locked = False
-        record.lockedby = None
-        self.session.add(record)
-        self.session.commit()
+        session.query(ASMDeployLock).filter(ASMDeployLock.id == self._lock_id(session)).update(
+            {"locked": False, "lockedby": None}, synchronize_session=False)
+        session.commit()
 
-    def _populate_filesets(self, filesets: dict) -> None:
+    def _deploy_records(self, session: Session) -> dict:
         """
-        Populate the filesets into the database.
+        Get the records in the deploy table.
 
         Args:
-            filesets: The filesets to populate.
+            session: The session of the current run.
 
         Returns:
-            None
+            The deploy records, keyed by filepath.
         """
-        dry_run = self.config_file.get("global", {}).get("dry_run", False)
+        return {record.filepath: record for record in session.query(ASMDeploy).all()}
+
+    def _plan_operations(self, filesets: dict, records: dict) -> list:
+        """
+        Compare the filesets against the deploy records and generate the ordered operations.
+        New and changed files are listed first in fileset order, followed by deleted files.
+
+        Args:
+            filesets: The filesets to compare.
+            records: The deploy records, keyed by filepath.
+
+        Returns:
+            The ordered list of operations.
+        """
+        operations = []
         for filepath in filesets:
-            record = self.session.query(ASMDeploy).filter(ASMDeploy.filepath == filepath).first()
+            record = records.get(filepath)
             if record is None:
                 logging.info(f"File {filepath} is not in the table, adding.")
-                if not dry_run:
-                    record = ASMDeploy(
-                        filepath=filepath,
-                        data=filesets[filepath].get("data"),
-                        checksum=filesets[filepath].get("checksum"),
-                        algorithm=filesets[filepath].get("algorithm"),
-                        author=self.author,
-                    )
-                    self.session.add(record)
-                    try:
-                        self.session.execute(text(record.data))
-                    except SQLAlchemyError as error:
-                        logging.error(f"An error occurred when trying to execute the script: {error}.")
-                        raise error from error
+                operation = "new"
+            elif record.checksum != filesets[filepath].get("checksum"):
+                logging.info(f"File {filepath} has changed, updating.")
+                operation = "changed"
             else:
-                logging.info(f"File {filepath} is in the table, checking for changes.")
-                if record.checksum != filesets[filepath].get("checksum"):
-                    logging.info(f"File {filepath} has changed, updating.")
-                    if not dry_run:
-                        record.data = filesets[filepath].get("data")
-                        record.checksum = filesets[filepath].get("checksum")
-                        record.algorithm = filesets[filepath].get("algorithm")
-                        record.author = self.author
-                        self.session.add(record)
-                        try:
-                            self.session.execute(text(record.data))
-                        except SQLAlchemyError as error:
-                            logging.error(f"An error occurred when trying to execute the script: {error}.")
-                            raise error from error
-                else:
-                    logging.info(f"File {filepath} has not changed, skipping.")
-
-    def _delete(self, filesets: dict):
-        """
-        Checks the paths in the table against the paths in the directory.
-        If the path is not in the directory, add it to the deletions table, and remove it from the deploy table.
-        Return a list of the sql data that was deleted.
-        """
-        records = self.session.query(ASMDeploy).all()
-        sql_data = []
-        for record in records:
-            if record.filepath not in filesets:
-                # add to sql data
-                logging.info(f"File {record.filepath} is not in the directory, deleting.")
-                sql_data.append(record)
-                self.session.delete(record)
-
-                # add to deletions table
+                logging.info(f"File {filepath} has not changed, skipping.")
+                continue
+            operations.append({
+                "operation": operation,
+                "filepath": filepath,
+                "data": filesets[filepath].get("data"),
+                "checksum": filesets[filepath].get("checksum"),
+                "algorithm": filesets[filepath].get("algorithm"),
+                "prior_checksum": None if record is None else record.checksum,
+            })
+
+        for filepath, record in records.items():
+            if filepath not in filesets:
+                logging.info(f"File {filepath} is not in the directory, deleting.")
+                operations.append({
+                    "operation": "deleted",
+                    "filepath": filepath,
+                    "data": record.data or "",
+                    "checksum": None,
+                    "algorithm": record.algorithm,
+                    "prior_checksum": record.checksum,
+                })
+        return operations
+
+    def _verify_operations(self, operations: list, records: dict) -> list:
+        """
+        Verify that the deploy records are still in the state each planned operation expects.
+
+        Args:
+            operations: The operations to verify.
+            records: The deploy records, keyed by filepath.
+
+        Returns:
+            The verified operations.
+        """
+        for operation in operations:
+            record = records.get(operation.get("filepath"))
+            prior_checksum = None if record is None else record.checksum
+            if prior_checksum != operation.get("prior_checksum"):
+                logging.error(
+                    f"File {operation.get('filepath')} expected prior checksum {operation.get('prior_checksum')}, "
+                    f"found {prior_checksum}.")
+                raise ValueError(f"Plan is stale for file {operation.get('filepath')}, cannot continue.")
+        return operations
+
+    def _execute(self, session: Session, sql: str) -> None:
+        """
+        Execute a script within the session.
+
+        Args:
+            session: The session of the current run.
+            sql: The script to execute.
+
+        Returns:
+            None
+        """
+        try:
+            session.execute(text(sql))
+        except SQLAlchemyError as error:
+            logging.error(f"An error occurred when trying to execute the script: {error}.")
+            raise error from error
+
+    def _apply_operations(self, session: Session, operations: list, records: dict) -> None:
+        """
+        Apply the operations to the database.
+
+        Args:
+            session: The session of the current run.
+            operations: The operations to apply.
+            records: The deploy records the operations were planned or verified against, keyed by filepath.
+
+        Returns:
+            None
+        """
+        dry_run = self.config_file.get("global", {}).get("dry_run", False)
+        for operation in operations:
+            filepath = operation.get("filepath")
+            logging.info(f"Applying {operation.get('operation')} operation for file {filepath}.")
+            if dry_run:
+                continue
+
+            if operation.get("operation") == "new":
+                record = ASMDeploy(
+                    filepath=filepath,
+                    data=operation.get("data"),
+                    checksum=operation.get("checksum"),
+                    algorithm=operation.get("algorithm"),
+                    author=self.author,
+                )
+                session.add(record)
+                self._execute(session, record.data)
+            elif operation.get("operation") == "changed":
+                record = records[filepath]
+                record.data = operation.get("data")
+                record.checksum = operation.get("checksum")
+                record.algorithm = operation.get("algorithm")
+                record.author = self.author
+                session.add(record)
+                self._execute(session, record.data)
+            elif operation.get("operation") == "deleted":
+                record = records[filepath]
+                session.delete(record)
                 deletion = ASMDeployDeletions(
                     deploy_id=record.id,
                     filepath=record.filepath,
                     data=record.data,
                     author=self.author,
                 )
-                self.session.add(deletion)
-
-        return sql_data
+                session.add(deletion)
+                self._execute_deletions(session, data=record.data or "")
+            else:
+                raise ValueError(f"Operation {operation.get('operation')} is not supported.")
 
-    def _execute_deletions(self, deletions: list) -> None:
+    def _execute_deletions(self, session: Session, data: str) -> None:
         """
         Use regex to find the Table, FUnction, Procedure or View and execute the DROP statement.
         """
         pattern = re.compile(
             r"(CREATE\s+OR\s+REPLACE|CREATE\s+OR\s+ALTER|CREATE|ALTER|REPLACE)\s+(FUNCTION|TABLE|VIEW|PROCEDURE)\s+([\w\.]+)\s*\(")
-        for deletion in deletions:
-            for match in re.finditer(pattern, deletion.data):
-                object_type = match.group(2)
-                object_name = match.group(3)
-                logging.info(f"Found {object_type} {object_name}, dropping.")
-                self.session.execute(text(f"DROP {object_type} {object_name} CASCADE;"))
+        for match in re.finditer(pattern, data):
+            object_type = match.group(2)
+            object_name = match.group(3)
+            logging.info(f"Found {object_type} {object_name}, dropping.")
+            self._execute(session, f"DROP {object_type} {object_name} CASCADE;")
+
+    def _run_operations(self, operations: Callable[[dict], list]) -> None:
+        """
+        Apply operations under the deploy lock, rolling back on error.
+        The lock is only opened again if this run closed it.
+
+        Args:
+            operations: A callable taking the deploy records and returning the operations to apply,
+                evaluated once the lock is held.
+
+        Returns:
+            None
+        """
+        with self._session_factory()() as session:
+            locked = False
+            try:
+                self._populate_lock_table(session)
+                self.close_lock(session)
+                locked = True
+                records = self._deploy_records(session)
+                self._apply_operations(session, operations=operations(records), records=records)
+                session.commit()
+            except (SQLAlchemyError, ValueError) as error:
+                logging.error(f"An error occurred within the session: {error}.")
+                session.rollback()
+                raise error from error
+            finally:
+                logging.info("Closing ASM session.")
+                if locked:
+                    self.open_lock(session)
 
     def run(self) -> None:
+        """
+        Scan the directory and apply the resulting operations in a single step.
+        """
         logging.info("Running ASM session.")
-        try:
-            self._populate_lock_table()
-            self.close_lock()
-            filesets = self._generate_filesets()
-            self._populate_filesets(filesets=filesets)
-            deletions = self._delete(filesets=filesets)
-            self._execute_deletions(deletions=deletions)
-            self.session.commit()
-        except SQLAlchemyError as error:
-            logging.error(f"An error occurred within the session: {error}.")
-            self.session.rollback()
-            raise error from error
-        finally:
-            logging.info("Closing ASM session.")
-            self.open_lock()
-            self.session.close()
+        self._run_operations(
+            operations=lambda records: self._plan_operations(filesets=self._generate_filesets(), records=records)
+        )
+
+    def plan(self, plan_file: str) -> dict:
+        """
+        Scan the directory and write the resulting operations to a sealed plan file, without applying them.
+
+        Args:
+            plan_file: The file to write the plan to.
+
+        Returns:
+            The sealed plan.
+        """
+        logging.info("Planning ASM session.")
+        with self._session_factory()() as session:
+            records = self._deploy_records(session)
+            operations = self._plan_operations(filesets=self._generate_filesets(), records=records)
+        plan = build_plan(operations=operations, author=self.author)
+        write_plan(plan=plan, plan_file=plan_file)
+        return plan
+
+    def apply(self, plan_file: str) -> None:
+        """
+        Apply the operations of a sealed plan file under the lock, without scanning the directory.
+
+        Args:
+            plan_file: The file to read the plan from.
+
+        Returns:
+            None
+        """
+        logging.info(f"Applying ASM plan {plan_file}.")
+        plan = read_plan(plan_file=plan_file)
+        self._run_operations(
+            operations=lambda records: self._verify_operations(operations=plan.get("operations"), records=records)
+        )
 
 
 class ASMDeploy(BASE):
@@ -0,0 +1,143 @@
+"""
+Plan management module.
+
+A plan is the ordered list of operations a run would perform against the database,
+written to a compact, checksum-sealed JSON file so it can be reviewed and applied later.
+"""
+import json
+import logging
+from datetime import datetime
+from hashlib import sha256
+
+PLAN_VERSION = 1
+PLAN_OPERATIONS = ("new", "changed", "deleted")
+PLAN_OPERATION_KEYS = ("operation", "filepath", "data", "checksum", "algorithm", "prior_checksum")
+
+
+def _validate_operation(operation: dict) -> None:
+    """
+    Validates the type and required keys of a plan operation.
+
+    Args:
+        operation: The operation to validate.
+
+    Returns:
+        None
+    """
+    if not isinstance(operation, dict):
+        raise ValueError(f"Operation {operation} is not a mapping.")
+    missing = [key for key in PLAN_OPERATION_KEYS if key not in operation]
+    if missing:
+        raise ValueError(f"Operation {operation.get('filepath')} is missing keys: {', '.join(missing)}.")
+    if operation.get("operation") not in PLAN_OPERATIONS:
+        raise ValueError(f"Operation {operation.get('operation')} is not supported.")
+    if not isinstance(operation.get("filepath"), str) or not isinstance(operation.get("data"), str):
+        raise ValueError(f"Operation {operation.get('filepath')} must have a string filepath and data.")
+    if (operation.get("prior_checksum") is None) != (operation.get("operation") == "new"):
+        raise ValueError(
+            f"Operation {operation.get('operation')} for file {operation.get('filepath')} "
+            f"has an invalid prior checksum.")
+    if (operation.get("checksum") is None) != (operation.get("operation") == "deleted"):
+        raise ValueError(
+            f"Operation {operation.get('operation')} for file {operation.get('filepath')} "
+            f"has an invalid checksum.")
+
+
+def _validate_operations(operations: list) -> None:
+    """
+    Validates each plan operation and that no file is operated on more than once.
+
+    Args:
+        operations: The operations to validate.
+
+    Returns:
+        None
+    """
+    filepaths = set()
+    for operation in operations:
+        _validate_operation(operation)
+        if operation.get("filepath") in filepaths:
+            raise ValueError(f"File {operation.get('filepath')} appears in more than one operation.")
+        filepaths.add(operation.get("filepath"))
+
+
+def _seal(plan: dict) -> str:
+    """
+    Generates the seal checksum for a plan.
+
+    Args:
+        plan: The plan to seal, without its checksum.
+
+    Returns:
+        The sha256 checksum of the canonical plan.
+    """
+    canonical = json.dumps(plan, sort_keys=True, separators=(",", ":"))
+    return sha256(canonical.encode("utf8")).hexdigest()
+
+
+def build_plan(operations: list, author: str) -> dict:
+    """
+    Builds a sealed plan from a list of operations.
+
+    Args:
+        operations: The ordered operations to include in the plan.
+        author: The author that generated the plan.
+
+    Returns:
+        The sealed plan.
+    """
+    _validate_operations(operations)
+
+    plan = {
+        "version": PLAN_VERSION,
+        "author": author,
+        "created": datetime.now().isoformat(),
+        "operations": operations,
+    }
+    plan["checksum"] = _seal(plan)
+    return plan
+
+
+def write_plan(plan: dict, plan_file: str) -> None:
+    """
+    Writes a sealed plan to a file.
+
+    Args:
+        plan: The sealed plan to write.
+        plan_file: The file to write the plan to.
+
+    Returns:
+        None
+    """
+    logging.info(f"Writing plan with {len(plan.get('operations', []))} operations to {plan_file}.")
+    with open(plan_file, "w", encoding="utf8") as _wplan_file:
+        json.dump(plan, _wplan_file, sort_keys=True, separators=(",", ":"))
+
+
+def read_plan(plan_file: str) -> dict:
+    """
+    Reads a sealed plan from a file and verifies its checksum, version and operations.
+
+    Args:
+        plan_file: The file to read the plan from.
+
+    Returns:
+        The verified plan.
+    """
+    logging.info(f"Reading plan from {plan_file}.")
+    with open(plan_file, "r", encoding="utf8") as _rplan_file:
+        plan = json.load(_rplan_file)
+
+    if not isinstance(plan, dict):
+        raise ValueError(f"Plan {plan_file} is not a mapping.")
+    checksum = plan.pop("checksum", None)
+    if checksum is None or checksum != _seal(plan):
+        raise ValueError(f"Plan {plan_file} failed checksum verification.")
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Plan version {plan.get('version')} is not supported.")
+    if not isinstance(plan.get("operations"), list):
+        raise ValueError(f"Plan {plan_file} does not contain a list of operations.")
+    _validate_operations(plan.get("operations"))
+
+    plan["checksum"] = checksum
+    return plan
@@ -9,6 +9,10 @@ global:
   dry_run: False  # Set to True for a dry run without actually executing SQL scripts
   isolation_level: READ UNCOMMITTED
   echo: False  # Set to True for SQLAlchemy echo mode (prints SQL statements)
+  pool_size: 5  # Optional, number of connections kept open per engine
+  max_overflow: 10  # Optional, number of connections allowed beyond pool_size
+  pool_pre_ping: True  # Optional, test connections for liveness before use
+  pool_recycle: 3600  # Optional, time (in seconds) after which connections are recycled
 
 # Checksum Settings
 checksum:
@@ -54,7 +58,11 @@ config_file_schema = schema.Schema(
         "global": {
             "dry_run": bool,
             "isolation_level": str,
-            "echo": bool
+            "echo": bool,
+            Optional("pool_size"): int,
+            Optional("max_overflow"): int,
+            Optional("pool_pre_ping"): bool,
+            Optional("pool_recycle"): int
         },
         "checksum": {
             "algorithm": str,
@@ -112,7 +120,11 @@ def generate_config_file(config_file: str) -> None:
         "global": {
             "dry_run": False,
             "isolation_level": "READ UNCOMMITTED",
-            "echo": False
+            "echo": False,
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_pre_ping": True,
+            "pool_recycle": 3600
         },
         "checksum": {
             "algorithm": "md5",
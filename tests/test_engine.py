@@ -0,0 +1,149 @@
+"""
+Tests for the process-wide engine registry.
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import yaml
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from apollo_script_master._asm import engine
+from apollo_script_master._asm.orm import ASMImpl, BASE
+from apollo_script_master.config import generate_config_file
+
+
+class TestEngineRegistry(unittest.TestCase):
+    """
+    Tests for creating, reusing and disposing registered engines.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.directory.name, 'asm.db')}"
+
+    def tearDown(self):
+        engine.dispose_engines()
+        self.directory.cleanup()
+
+    def test_engine_is_reused_per_key(self):
+        factory = engine.get_session_factory(self.url, BASE.metadata, echo=False)
+        self.assertIs(engine.get_session_factory(self.url, BASE.metadata, echo=False), factory)
+        self.assertIsNot(engine.get_session_factory(self.url, BASE.metadata, echo=True), factory)
+
+    def test_engine_is_created_once_across_threads(self):
+        factories = []
+        with mock.patch.object(engine, "create_engine", wraps=engine.create_engine) as create_engine:
+            threads = [
+                threading.Thread(target=lambda: factories.append(engine.get_session_factory(self.url, BASE.metadata)))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(create_engine.call_count, 1)
+        self.assertEqual(len({id(factory) for factory in factories}), 1)
+
+    def test_failed_bootstrap_disposes_engine(self):
+        metadata = mock.Mock()
+        metadata.create_all.side_effect = OperationalError("create_all", {}, Exception("unreachable"))
+        with mock.patch.object(engine, "create_engine") as create_engine:
+            with self.assertRaises(OperationalError):
+                engine.get_session_factory(self.url, metadata)
+        create_engine.return_value.dispose.assert_called_once()
+        self.assertIsNotNone(engine.get_session_factory(self.url, BASE.metadata))
+
+
+class TestASMEngineReuse(unittest.TestCase):
+    """
+    Tests for ASM runs sharing registered engines and the deploy lock.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.scripts = os.path.join(self.directory.name, "sql")
+        os.mkdir(self.scripts)
+        self.url = f"sqlite:///{os.path.join(self.directory.name, 'asm.db')}"
+        self.url_manager = mock.patch("apollo_script_master._asm.orm.url_manager", return_value=self.url)
+        self.url_manager.start()
+
+    def tearDown(self):
+        self.url_manager.stop()
+        engine.dispose_engines()
+        self.directory.cleanup()
+
+    def _asm(self, **global_config) -> ASMImpl:
+        config_file = os.path.join(self.directory.name, "asm.yml")
+        generate_config_file(config_file)
+        with open(config_file, "r", encoding="utf8") as _rconfig_file:
+            config = yaml.safe_load(_rconfig_file)
+        config["global"].update(isolation_level="SERIALIZABLE", **global_config)
+        config["deploy_lock_table"].update(lock_check_retries=20, lock_check_wait=1)
+        with open(config_file, "w", encoding="utf8") as _wconfig_file:
+            yaml.dump(config, _wconfig_file)
+        return ASMImpl({}, os.path.join(self.scripts, "*.sql"), "tester", config_file)
+
+    def _query(self, sql: str) -> list:
+        sqlite_engine = create_engine(self.url)
+        try:
+            with sqlite_engine.begin() as connection:
+                result = connection.execute(text(sql))
+                return result.fetchall() if result.returns_rows else []
+        finally:
+            sqlite_engine.dispose()
+
+    def test_runs_share_one_engine(self):
+        with mock.patch.object(engine, "create_engine", wraps=engine.create_engine) as create_engine_mock, \
+                mock.patch.object(BASE.metadata, "create_all", wraps=BASE.metadata.create_all) as create_all:
+            self._asm().run()
+            self._asm().run()
+            self._asm().plan(plan_file=os.path.join(self.directory.name, "asm.plan.json"))
+        self.assertEqual(create_engine_mock.call_count, 1)
+        self.assertEqual(create_all.call_count, 1)
+
+    def test_pool_options_are_passed_to_engine(self):
+        with mock.patch.object(engine, "create_engine", wraps=engine.create_engine) as create_engine_mock:
+            self._asm(pool_size=3, max_overflow=7, pool_recycle=60, pool_pre_ping=False).run()
+        _, options = create_engine_mock.call_args
+        self.assertEqual(options["pool_size"], 3)
+        self.assertEqual(options["max_overflow"], 7)
+        self.assertEqual(options["pool_recycle"], 60)
+        self.assertIs(options["pool_pre_ping"], False)
+
+    def test_concurrent_runs_apply_once(self):
+        with open(os.path.join(self.scripts, "1_test.table.sql"), "w", encoding="utf8") as _wscript:
+            _wscript.write("CREATE TABLE test_table (id int);")
+        self._asm().plan(plan_file=os.path.join(self.directory.name, "asm.plan.json"))
+        errors = []
+
+        def run(asm: ASMImpl):
+            try:
+                asm.run()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=(self._asm(),)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self._query("SELECT filepath FROM ASMDeploy")), 1)
+        self.assertEqual(self._query("SELECT locked FROM ASMDeployLock"), [(0,)])
+
+    def test_failed_close_lock_keeps_other_runs_lock(self):
+        self._asm().run()
+        self._query("UPDATE ASMDeployLock SET locked = 1, lockedby = 'other'")
+        asm = self._asm()
+        asm.config_file["deploy_lock_table"].update(lock_check_retries=1, lock_check_wait=0)
+        with self.assertRaisesRegex(Exception, "Lock is still closed"):
+            asm.run()
+        self.assertEqual(self._query("SELECT locked, lockedby FROM ASMDeployLock"), [(1, "other")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Tests for the sealed plan file and the plan/apply split.
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+from sqlalchemy import create_engine, text
+
+from apollo_script_master._asm.engine import dispose_engines
+from apollo_script_master._asm.orm import ASMImpl
+from apollo_script_master._asm.plan import _seal, build_plan, read_plan, write_plan
+from apollo_script_master.config import generate_config_file
+
+OPERATION = {
+    "operation": "new",
+    "filepath": "sql/1_test.table.sql",
+    "data": "CREATE TABLE test_table (id int);",
+    "checksum": "abc",
+    "algorithm": "md5",
+    "prior_checksum": None,
+}
+
+
+class TestPlanFile(unittest.TestCase):
+    """
+    Tests for writing and reading sealed plan files.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.plan_file = os.path.join(self.directory.name, "asm.plan.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _rewrite(self, **changes):
+        with open(self.plan_file, "r", encoding="utf8") as _rplan_file:
+            plan = json.load(_rplan_file)
+        plan.update(changes)
+        with open(self.plan_file, "w", encoding="utf8") as _wplan_file:
+            json.dump(plan, _wplan_file)
+
+    def test_round_trip(self):
+        plan = build_plan(operations=[OPERATION], author="tester")
+        write_plan(plan=plan, plan_file=self.plan_file)
+        self.assertEqual(read_plan(plan_file=self.plan_file), plan)
+
+    def test_tampered_plan_is_rejected(self):
+        write_plan(plan=build_plan(operations=[OPERATION], author="tester"), plan_file=self.plan_file)
+        self._rewrite(author="someone else")
+        with self.assertRaisesRegex(ValueError, "checksum verification"):
+            read_plan(plan_file=self.plan_file)
+
+    def test_unknown_operation_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "not supported"):
+            build_plan(operations=[dict(OPERATION, operation="truncate")], author="tester")
+
+    def _reseal(self, *operations: dict) -> None:
+        plan = build_plan(operations=[OPERATION], author="tester")
+        plan.pop("checksum")
+        plan["operations"] = list(operations)
+        plan["checksum"] = _seal(plan)
+        write_plan(plan=plan, plan_file=self.plan_file)
+
+    def test_resealed_unknown_operation_is_rejected(self):
+        self._reseal(dict(OPERATION, operation="truncate"))
+        with self.assertRaisesRegex(ValueError, "not supported"):
+            read_plan(plan_file=self.plan_file)
+
+    def test_resealed_incomplete_operation_is_rejected(self):
+        self._reseal({key: value for key, value in OPERATION.items() if key != "data"})
+        with self.assertRaisesRegex(ValueError, "missing keys: data"):
+            read_plan(plan_file=self.plan_file)
+
+    def test_resealed_duplicate_filepath_is_rejected(self):
+        self._reseal(OPERATION, OPERATION)
+        with self.assertRaisesRegex(ValueError, "more than one operation"):
+            read_plan(plan_file=self.plan_file)
+
+
+class TestPlanApply(unittest.TestCase):
+    """
+    Tests for planning and applying against a SQLite database.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.scripts = os.path.join(self.directory.name, "sql")
+        os.mkdir(self.scripts)
+        self.plan_file = os.path.join(self.directory.name, "asm.plan.json")
+        self.url = f"sqlite:///{os.path.join(self.directory.name, 'asm.db')}"
+        self.url_manager = mock.patch("apollo_script_master._asm.orm.url_manager", return_value=self.url)
+        self.url_manager.start()
+
+    def tearDown(self):
+        self.url_manager.stop()
+        dispose_engines()
+        self.directory.cleanup()
+
+    def _asm(self, dry_run: bool = False) -> ASMImpl:
+        config_file = os.path.join(self.directory.name, "asm.yml")
+        generate_config_file(config_file)
+        with open(config_file, "r", encoding="utf8") as _rconfig_file:
+            config = yaml.safe_load(_rconfig_file)
+        config["global"].update(dry_run=dry_run, isolation_level="SERIALIZABLE")
+        with open(config_file, "w", encoding="utf8") as _wconfig_file:
+            yaml.dump(config, _wconfig_file)
+        return ASMImpl({}, os.path.join(self.scripts, "*.sql"), "tester", config_file)
+
+    def _write_script(self, name: str, sql: str) -> None:
+        with open(os.path.join(self.scripts, name), "w", encoding="utf8") as _wscript:
+            _wscript.write(sql)
+
+    def _query(self, sql: str) -> list:
+        engine = create_engine(self.url)
+        try:
+            with engine.begin() as connection:
+                result = connection.execute(text(sql))
+                return result.fetchall() if result.returns_rows else []
+        finally:
+            engine.dispose()
+
+    def test_plan_then_apply(self):
+        self._write_script("1_test.table.sql", "CREATE TABLE test_table (id int); -- comment")
+        plan = self._asm().plan(plan_file=self.plan_file)
+        self.assertEqual([operation["operation"] for operation in plan["operations"]], ["new"])
+        self.assertEqual(self._query("SELECT filepath FROM ASMDeploy"), [])
+
+        self._asm().apply(plan_file=self.plan_file)
+        self.assertEqual(len(self._query("SELECT filepath FROM ASMDeploy")), 1)
+        self.assertEqual(self._query("SELECT COUNT(*) FROM test_table"), [(0,)])
+
+    def test_stale_plan_is_rejected(self):
+        self._write_script("1_test.table.sql", "CREATE TABLE test_table (id int);")
+        self._asm().plan(plan_file=self.plan_file)
+        self._asm().run()
+        with self.assertRaisesRegex(ValueError, "stale"):
+            self._asm().apply(plan_file=self.plan_file)
+
+    def test_dry_run_skips_deletions(self):
+        self._write_script("1_test.table.sql", "CREATE TABLE test_table (id int);")
+        self._asm().run()
+        os.remove(os.path.join(self.scripts, "1_test.table.sql"))
+
+        self._asm(dry_run=True).run()
+        self.assertEqual(len(self._query("SELECT filepath FROM ASMDeploy")), 1)
+        self.assertEqual(self._query("SELECT filepath FROM ASMDeployDeletions"), [])
+        self.assertEqual(self._query("SELECT COUNT(*) FROM test_table"), [(0,)])
+
+    def test_deletion_with_null_data(self):
+        self._asm().run()
+        self._query("INSERT INTO ASMDeploy (filepath, data, checksum, algorithm) VALUES ('gone.sql', NULL, 'abc', 'md5')")
+
+        plan = self._asm().plan(plan_file=self.plan_file)
+        self.assertEqual([operation["operation"] for operation in plan["operations"]], ["deleted"])
+        self._asm().run()
+        self.assertEqual(self._query("SELECT filepath FROM ASMDeploy"), [])
+        self.assertEqual(self._query("SELECT filepath FROM ASMDeployDeletions"), [("gone.sql",)])
+
+
+if __name__ == "__main__":
+    unittest.main()